@@ -1,53 +1,162 @@
-import sqlite3
 import asyncio
+import atexit
+import contextlib
 import logging
+import logging.handlers
 import os
-from io import StringIO
+import queue
+import re
+import functools
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+from typing import NamedTuple
 from dotenv import load_dotenv
-import pandas as pd
-from aiogram import Bot, Dispatcher, Router
-from aiogram.filters import Command, CommandStart
+import aiosqlite
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.exceptions import TelegramAPIError
+from aiogram.filters import Command, CommandStart, StateFilter
 from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.types import CallbackQuery
-from openpyxl import load_workbook
+from aiogram.types import CallbackQuery, ErrorEvent
 import csv
 
-# Настройка логирования
-logging.basicConfig(
-    filename='bot.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# uvloop ускоряет цикл событий, но необязателен (например, недоступен на Windows)
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+# orjson быстрее стандартного json при разборе апдейтов и сериализации запросов, но тоже необязателен
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Загрузка переменных окружения из .env
+load_dotenv()
+
+# Файлы бота (лог, база данных, программа тренировок) лежат рядом с main.py независимо от рабочего каталога
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Формат лога не использует сведения о потоках и процессах, поэтому они не собираются в записи.
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+
+# Настройка логирования: подробный INFO-лог только при DEBUG_BOT=1, иначе WARNING и выше.
+# Обработчики лишь кладут записи в очередь, а запись в bot.log идёт в отдельном потоке,
+# чтобы файловый ввод-вывод не блокировал цикл событий. Файл ротируется, чтобы не расти бесконечно.
+# Путь к логу можно переопределить переменной BOT_LOG_PATH (например, во временный файл в тестах).
+LOG_PATH = os.getenv("BOT_LOG_PATH") or os.path.join(BASE_DIR, 'bot.log')
+_log_queue = queue.SimpleQueue()
+_file_handler = logging.handlers.RotatingFileHandler(LOG_PATH, maxBytes=5_000_000, backupCount=3)
+_file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+log_listener = logging.handlers.QueueListener(_log_queue, _file_handler, respect_handler_level=True)
+logging.root.addHandler(logging.handlers.QueueHandler(_log_queue))
+logging.root.setLevel(logging.INFO if os.getenv("DEBUG_BOT") == "1" else logging.WARNING)
+log_listener.start()
+atexit.register(log_listener.stop)
 logger = logging.getLogger(__name__)
 
 # Загрузка токена из .env
-load_dotenv()
 API_TOKEN = os.getenv("API_TOKEN")
 if not API_TOKEN:
     logger.error("API_TOKEN не найден в .env файле")
     raise ValueError("API_TOKEN не задан в .env файле")
 
 # Инициализация бота
-bot = Bot(token=API_TOKEN)
-storage = MemoryStorage()
+if orjson is not None:
+    session = AiohttpSession(json_loads=orjson.loads, json_dumps=lambda obj: orjson.dumps(obj).decode())
+else:
+    session = AiohttpSession()
+bot = Bot(token=API_TOKEN, session=session)
+
+# Режим webhook включается переменной WEBHOOK_URL (публичный адрес бота), иначе используется polling
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", "8080"))
+
+# Хранилище FSM: при заданном REDIS_URL состояние переживает перезапуск бота, иначе хранится в памяти процесса.
+# Кэши весов и планов (_user_cache, _render_cache) всё равно локальны для процесса и не сбрасываются при записи
+# из другого процесса, поэтому бот должен работать в одном процессе и с Redis
+REDIS_URL = os.getenv("REDIS_URL")
+FSM_TTL = 24 * 60 * 60
+if REDIS_URL:
+    from aiogram.fsm.storage.redis import RedisStorage
+    storage = RedisStorage.from_url(REDIS_URL, state_ttl=FSM_TTL, data_ttl=FSM_TTL)
+else:
+    storage = MemoryStorage()
 dp = Dispatcher(bot=bot, storage=storage)
 router = Router()
 dp.include_router(router)
 
 # Путь к базе данных SQLite
-DB_PATH = 'gym_bot.db'
+DB_PATH = os.path.join(BASE_DIR, 'gym_bot.db')
+
+# SQL-запросы хранятся константами: одинаковый текст запроса позволяет sqlite3
+# повторно использовать уже подготовленные выражения долгоживущего соединения
+_SELECT_USER_SQL = 'SELECT bench_press, squat, deadlift FROM users WHERE user_id = ?'
+_UPSERT_USER_SQL = 'INSERT OR REPLACE INTO users (user_id, bench_press, squat, deadlift) VALUES (?, ?, ?, ?)'
+_DELETE_USER_SQL = 'DELETE FROM users WHERE user_id = ?'
+
+# Настройки каждого соединения: WAL не блокирует чтение во время записи,
+# synchronous=NORMAL убирает fsync на каждый коммит в режиме WAL
+_CONNECTION_PRAGMAS = '''
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-64000;
+    PRAGMA mmap_size=268435456;
+'''
+
+
+class UserMax(NamedTuple):
+    """Максимальные веса пользователя в порядке столбцов таблицы users."""
+    bench_press: float = 0.0
+    squat: float = 0.0
+    deadlift: float = 0.0
+
+
+# Пул долгоживущих соединений с базой данных, заполняется в init_db()
+DB_POOL_SIZE = 4
+_db_pool: asyncio.Queue[aiosqlite.Connection] | None = None
+
+# Кэш максимальных весов пользователей: данные меняются только при вводе или сбросе весов
+USER_CACHE_SIZE = 10000
+_user_cache: OrderedDict[int, UserMax] = OrderedDict()
+# Номер поколения кэша: увеличивается при каждой записи, чтобы результат SELECT, начатого до записи
+# на другом соединении пула, не вернул в кэш устаревшие данные
+_user_cache_generation = 0
+
+# Кэш отформатированных планов: user_id -> {(неделя, день): (веса, текст)}.
+# Записи проверяются по весам, поэтому TTL не нужен; хранятся планы последних RENDER_CACHE_SIZE пользователей
+RENDER_CACHE_SIZE = 1024
+_render_cache: OrderedDict[int, dict[tuple[int, str], tuple[UserMax, str]]] = OrderedDict()
+
+
+async def _open_connection() -> aiosqlite.Connection:
+    """Открывает соединение с базой данных и настраивает его."""
+    conn = await aiosqlite.connect(DB_PATH)
+    # PRAGMA действуют на соединение, поэтому задаются для каждого соединения пула
+    await conn.executescript(_CONNECTION_PRAGMAS)
+    return conn
 
 
 # Инициализация базы данных
-def init_db():
-    """Инициализирует базу данных SQLite и создаёт таблицу users, если она не существует."""
+async def init_db() -> None:
+    """Открывает пул соединений с базой данных SQLite и создаёт таблицу users, если она не существует."""
+    global _db_pool
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
+        _db_pool = asyncio.Queue()
+        for _ in range(DB_POOL_SIZE):
+            _db_pool.put_nowait(await _open_connection())
+        async with db_connection() as conn:
+            await conn.execute('''
                 CREATE TABLE IF NOT EXISTS users (
                     user_id INTEGER PRIMARY KEY,
                     bench_press REAL DEFAULT 0.0,
@@ -55,104 +164,135 @@ def init_db():
                     deadlift REAL DEFAULT 0.0
                 )
             ''')
-            conn.commit()
-            logger.info("База данных инициализирована")
-    except sqlite3.Error as e:
-        logger.error(f"Ошибка при инициализации базы данных: {e}")
+            await conn.commit()
+        logger.info("База данных инициализирована")
+    except aiosqlite.Error as e:
+        logger.error("Ошибка при инициализации базы данных: %s", e)
         raise
 
 
+async def close_db() -> None:
+    """Закрывает все соединения пула."""
+    global _db_pool
+    if _db_pool is not None:
+        while not _db_pool.empty():
+            await _db_pool.get_nowait().close()
+        _db_pool = None
+        logger.info("Соединения с базой данных закрыты")
+
+
+@contextlib.asynccontextmanager
+async def db_connection() -> AsyncIterator[aiosqlite.Connection]:
+    """Берёт соединение из пула на время блока и возвращает его обратно."""
+    conn = await _db_pool.get()
+    try:
+        yield conn
+    finally:
+        _db_pool.put_nowait(conn)
+
+
 # Функции для работы с базой данных
-def save_user_data(user_id: int, data: dict) -> None:
-    """Сохраняет данные пользователя в базу данных."""
+def _invalidate_user_data(user_id: int) -> None:
+    """Сбрасывает кэши пользователя после записи в базу данных."""
+    global _user_cache_generation
+    _user_cache_generation += 1
+    _user_cache.pop(user_id, None)
+    _render_cache.pop(user_id, None)
+
+
+def _cache_user_data(user_id: int, data: UserMax) -> None:
+    """Кладёт данные пользователя в кэш, вытесняя самые давние записи."""
+    _user_cache[user_id] = data
+    _user_cache.move_to_end(user_id)
+    if len(_user_cache) > USER_CACHE_SIZE:
+        _user_cache.popitem(last=False)
+
+
+async def save_user_data(user_id: int, data: dict) -> UserMax:
+    """Сохраняет веса из данных FSM в базу данных и возвращает их."""
+    user_data = UserMax(
+        data.get('bench_press', 0.0),
+        data.get('squat', 0.0),
+        data.get('deadlift', 0.0)
+    )
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT OR REPLACE INTO users (user_id, bench_press, squat, deadlift)
-                VALUES (?, ?, ?, ?)
-            ''', (
-                user_id,
-                data.get('bench_press', 0.0),
-                data.get('squat', 0.0),
-                data.get('deadlift', 0.0)
-            ))
-            conn.commit()
-            logger.info(f"Данные пользователя {user_id} сохранены: {data}")
-    except sqlite3.Error as e:
-        logger.error(f"Ошибка при сохранении данных пользователя {user_id}: {e}")
+        async with db_connection() as conn:
+            await conn.execute(_UPSERT_USER_SQL, (user_id, *user_data))
+            await conn.commit()
+        _invalidate_user_data(user_id)
+        _cache_user_data(user_id, user_data)
+        logger.info("Данные пользователя %s сохранены: %s", user_id, user_data)
+        return user_data
+    except aiosqlite.Error as e:
+        logger.error("Ошибка при сохранении данных пользователя %s: %s", user_id, e)
         raise
 
 
-def load_user_data(user_id: int) -> dict:
-    """Загружает данные пользователя из базы данных."""
+async def load_user_data(user_id: int) -> UserMax:
+    """Загружает данные пользователя из кэша или из базы данных."""
+    cached = _user_cache.get(user_id)
+    if cached is not None:
+        _user_cache.move_to_end(user_id)
+        return cached
+    generation = _user_cache_generation
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT bench_press, squat, deadlift FROM users WHERE user_id = ?', (user_id,))
-            result = cursor.fetchone()
-            if result:
-                return {
-                    'bench_press': result[0],
-                    'squat': result[1],
-                    'deadlift': result[2]
-                }
-            return {'bench_press': 0.0, 'squat': 0.0, 'deadlift': 0.0}
-    except sqlite3.Error as e:
-        logger.error(f"Ошибка при загрузке данных пользователя {user_id}: {e}")
-        return {'bench_press': 0.0, 'squat': 0.0, 'deadlift': 0.0}
-
-
-def clear_user_data(user_id: int) -> None:
+        async with db_connection() as conn:
+            async with conn.execute(_SELECT_USER_SQL, (user_id,)) as cursor:
+                result = await cursor.fetchone()
+        user_data = UserMax(*result) if result else UserMax()
+        # Если во время запроса данные менялись, прочитанное значение могло устареть и в кэш не кладётся
+        if generation == _user_cache_generation:
+            _cache_user_data(user_id, user_data)
+        return user_data
+    except aiosqlite.Error as e:
+        logger.error("Ошибка при загрузке данных пользователя %s: %s", user_id, e)
+        return UserMax()
+
+
+async def clear_user_data(user_id: int) -> None:
     """Очищает данные пользователя в базе данных."""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM users WHERE user_id = ?', (user_id,))
-            conn.commit()
-            logger.info(f"Данные пользователя {user_id} очищены")
-    except sqlite3.Error as e:
-        logger.error(f"Ошибка при очистке данных пользователя {user_id}: {e}")
+        async with db_connection() as conn:
+            await conn.execute(_DELETE_USER_SQL, (user_id,))
+            await conn.commit()
+        _invalidate_user_data(user_id)
+        logger.info("Данные пользователя %s очищены", user_id)
+    except aiosqlite.Error as e:
+        logger.error("Ошибка при очистке данных пользователя %s: %s", user_id, e)
         raise
 
 
-# Создание reply-клавиатуры для команд
-def get_reply_command_keyboard() -> ReplyKeyboardMarkup:
-    """Создаёт reply-клавиатуру с кнопками для команд."""
-    keyboard = ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="неделя")],
-            [KeyboardButton(text="результаты"), KeyboardButton(text="сбросить")],
-            [KeyboardButton(text="помощь")]
-        ],
-        resize_keyboard=True,
-        is_persistent=True
-    )
-    return keyboard
-
-
-# Создание reply-клавиатуры с днями и кнопкой "Назад"
-def get_days_only_keyboard() -> ReplyKeyboardMarkup:
-    """Создаёт reply-клавиатуру с кнопками для дней и кнопкой 'Назад'."""
-    keyboard = ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="понедельник"), KeyboardButton(text="среда"), KeyboardButton(text="пятница")],
-            [KeyboardButton(text="Назад")]
-        ],
-        resize_keyboard=True,
-        is_persistent=True
-    )
-    return keyboard
+# Reply-клавиатура для команд: отправляется почти в каждом ответе, поэтому создаётся один раз
+COMMAND_KEYBOARD = ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="неделя")],
+        [KeyboardButton(text="результаты"), KeyboardButton(text="сбросить")],
+        [KeyboardButton(text="помощь")]
+    ],
+    resize_keyboard=True,
+    is_persistent=True
+)
+
+
+# Reply-клавиатура с днями и кнопкой "Назад": создаётся один раз и отправляется с каждым планом
+DAYS_KEYBOARD = ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="понедельник"), KeyboardButton(text="среда"), KeyboardButton(text="пятница")],
+        [KeyboardButton(text="Назад")]
+    ],
+    resize_keyboard=True,
+    is_persistent=True
+)
 
 
-# Создание inline-клавиатуры для выбора недели
-def get_week_keyboard() -> InlineKeyboardMarkup:
-    """Создаёт inline-клавиатуру с кнопками для выбора недели."""
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text=str(i), callback_data=f"week_{i}") for i in range(1, 5)],
-        [InlineKeyboardButton(text=str(i), callback_data=f"week_{i}") for i in range(5, 9)]
-    ])
-    return keyboard
+# Inline-клавиатура для выбора недели: разметка статична, поэтому создаётся один раз
+WEEK_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text=str(i), callback_data=f"week_{i}") for i in range(1, 5)],
+    [InlineKeyboardButton(text=str(i), callback_data=f"week_{i}") for i in range(5, 9)]
+])
+
+# Номер недели по callback_data кнопок WEEK_KEYBOARD
+_WEEK_LOOKUP = {f"week_{i}": i for i in range(1, 9)}
 
 
 # Определение машины состояний для ввода максимальных весов и выбора недели
@@ -163,23 +303,52 @@ class MaxLiftForm(StatesGroup):
     week_selection = State()
 
 
+# Файлы программы тренировок лежат рядом с main.py и читаются один раз при запуске
+TRAINING_XLSX = os.path.join(BASE_DIR, 'training.xlsx')
+TRAINING_CSV = os.path.join(BASE_DIR, 'training.csv')
+
+
+def _read_excel_rows(excel_file: str) -> list:
+    """Возвращает значения строк первого листа Excel-файла.
+
+    Библиотеки для чтения xlsx импортируются только здесь: при актуальном training.csv они не загружаются.
+    """
+    # python-calamine читает xlsx нативным парсером заметно быстрее openpyxl; без него используется openpyxl
+    try:
+        from python_calamine import CalamineWorkbook
+    except ImportError:
+        pass
+    else:
+        return CalamineWorkbook.from_path(excel_file).get_sheet_by_index(0).to_python()
+
+    from openpyxl import load_workbook
+    # Режим только для чтения: строки читаются потоком, без построения объектов ячеек
+    wb = load_workbook(excel_file, read_only=True, data_only=True)
+    try:
+        return list(wb.active.iter_rows(min_row=1, values_only=True))
+    finally:
+        # Книга в этом режиме держит открытым zip-архив до явного закрытия
+        wb.close()
+
+
 def csv_from_excel():
     """Конвертирует Excel-файл 'Муж высокий 3дневный.xlsx' в CSV с правильной структурой."""
-    excel_file = 'training.xlsx'
+    excel_file = TRAINING_XLSX
     if not os.path.exists(excel_file):
-        logger.error(f"Файл {excel_file} не найден")
+        logger.error("Файл %s не найден", excel_file)
         raise FileNotFoundError(f"Файл {excel_file} не найден")
 
-    # Загружаем Excel-файл
-    wb = load_workbook(excel_file)
-    sheet = wb.active
+    # CSV новее Excel-файла — повторная конвертация не нужна
+    if os.path.exists(TRAINING_CSV) and os.path.getmtime(TRAINING_CSV) >= os.path.getmtime(excel_file):
+        logger.info("Файл training.csv актуален, конвертация пропущена")
+        return
 
     # Подготовка данных для CSV
     data = []
     current_week = None
     current_day = None
 
-    for row in sheet.iter_rows(min_row=1, values_only=True):
+    for row in _read_excel_rows(excel_file):
         if not any(row):  # Пропускаем пустые строки
             continue
         if isinstance(row[0], str) and row[0].startswith('неделя'):
@@ -197,320 +366,383 @@ def csv_from_excel():
             data.append([current_week, current_day, exercise, intensity, reps])
 
     # Записываем данные в CSV
-    with open('training.csv', 'w', newline='', encoding='utf-8') as f:
+    with open(TRAINING_CSV, 'w', newline='', encoding='utf-8') as f:
         writer = csv.writer(f)
         writer.writerow(['неделя', 'день', 'упражнения', 'интенсивность', 'подходы х повторения'])
         writer.writerows(data)
 
-    logger.info(f"Файл {excel_file} успешно конвертирован в training.csv")
+    logger.info("Файл %s успешно конвертирован в training.csv", excel_file)
+
+
+def load_plan() -> dict[int, dict[str, list[tuple[str, str, str, str, int]]]]:
+    """Читает training.csv в словарь PLAN[неделя][день].
+
+    Каждое упражнение хранится как (название, ключ упражнения, ключ интенсивности, подходы, номер поля UserMax
+    базового упражнения); название и ключи очищаются от пробелов по краям, ключи приводятся к нижнему регистру,
+    а базовое упражнение берётся из EXERCISE_MAPPING один раз при загрузке.
+    """
+    plan: dict[int, dict[str, list[tuple[str, str, str, str, int]]]] = {}
+    with open(TRAINING_CSV, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            exercise = row['упражнения'].strip()
+            exercise_key = exercise.lower()
+            plan.setdefault(int(row['неделя']), {}).setdefault(row['день'], []).append((
+                exercise,
+                exercise_key,
+                row['интенсивность'].strip().lower(),
+                row['подходы х повторения'],
+                UserMax._fields.index(EXERCISE_MAPPING.get(exercise_key, _DEFAULT_MAPPING).main_lift)
+            ))
+    return plan
 
 
-# Загрузка данных из CSV
-try:
-    csv_from_excel()
-    df = pd.read_csv('training.csv', encoding='utf-8')
-    logger.info("CSV данные успешно загружены")
-except Exception as e:
-    logger.error(f"Ошибка при чтении CSV данных: {e}")
-    raise
+class Exercise(NamedTuple):
+    """Параметры расчёта рабочего веса упражнения от максимума в базовом упражнении."""
+    main_lift: str
+    scale: float
+    min_weight: float
+    max_weight: float
+    increment: float
+
 
 # Маппинг упражнений для расчёта весов
 EXERCISE_MAPPING = {
-    "жим лёжа": {"main_lift": "bench_press", "scale": 1.0, "min_weight": 20.0, "max_weight": 500.0, "increment": 2.5},
-    "присед со штангой": {"main_lift": "squat", "scale": 1.0, "min_weight": 20.0, "max_weight": 600.0,
-                          "increment": 2.5},
-    "классическая тяга": {"main_lift": "deadlift", "scale": 1.0, "min_weight": 20.0, "max_weight": 700.0,
-                          "increment": 2.5},
-    "тяга вертикального блока": {"main_lift": "bench_press", "scale": 0.55, "min_weight": 10.0, "max_weight": 120.0,
-                                 "increment": 2.5},
-    "тяга горизонтального блока": {"main_lift": "bench_press", "scale": 0.55, "min_weight": 10.0, "max_weight": 120.0,
-                                   "increment": 2.5},
-    "шраги с гантелями": {"main_lift": "deadlift", "scale": 0.20, "min_weight": 4.0, "max_weight": 80.0,
-                          "increment": 2.0},
-    "косичка": {"main_lift": "bench_press", "scale": 0.50, "min_weight": 5.0, "max_weight": 50.0, "increment": 2.5},
-    "французский жим лёжа": {"main_lift": "bench_press", "scale": 0.25, "min_weight": 10.0, "max_weight": 60.0,
-                             "increment": 2.5},
-    "сгибания на бицепс ez грифа": {"main_lift": "bench_press", "scale": 0.35, "min_weight": 5.0, "max_weight": 50.0,
-                                    "increment": 2.5},
-    "подъем на бицепс с прямым грифом": {"main_lift": "bench_press", "scale": 0.3, "min_weight": 10.0,
-                                         "max_weight": 50.0, "increment": 2.5},
-    "молотки": {"main_lift": "bench_press", "scale": 0.20, "min_weight": 4.0, "max_weight": 30.0, "increment": 2.0},
-    "передняя дельта": {"main_lift": "bench_press", "scale": 0.18, "min_weight": 4.0, "max_weight": 25.0,
-                        "increment": 2.0},
-    "махи на среднюю дельту": {"main_lift": "bench_press", "scale": 0.15, "min_weight": 2.0, "max_weight": 25.0,
-                               "increment": 2.0},
-    "отведения на дельты": {"main_lift": "bench_press", "scale": 0.20, "min_weight": 10.0, "max_weight": 35.0,
-                            "increment": 2.0},
-    "подъем на носки в смите": {"main_lift": "squat", "scale": 0.3, "min_weight": 30.0, "max_weight": 100.0,
-                                "increment": 5.0},
-    "сгибание на предплечье": {"main_lift": "bench_press", "scale": 0.6, "min_weight": 25.0, "max_weight": 60.0,
-                               "increment": 2.5},
-    "разгибание на предплечье": {"main_lift": "bench_press", "scale": 0.6, "min_weight": 25.0, "max_weight": 60.0,
-                                 "increment": 2.5},
-    "разгибания ног в тренажере": {"main_lift": "squat", "scale": 0.60, "min_weight": 30.0, "max_weight": 100.0,
-                                   "increment": 5.0},
-    "сгибания ног в тренажере": {"main_lift": "squat", "scale": 0.60, "min_weight": 30.0, "max_weight": 90.0,
-                                 "increment": 5.0},
-    "жим гантелей лёжа 30°": {"main_lift": "bench_press", "scale": 0.30, "min_weight": 10.0, "max_weight": 50.0,
-                              "increment": 2.0},
-    "жим штанги": {"main_lift": "bench_press", "scale": 1.0, "min_weight": 20.0, "max_weight": 500.0, "increment": 2.5}
+    "жим лёжа": Exercise("bench_press", 1.0, 20.0, 500.0, 2.5),
+    "присед со штангой": Exercise("squat", 1.0, 20.0, 600.0, 2.5),
+    "классическая тяга": Exercise("deadlift", 1.0, 20.0, 700.0, 2.5),
+    "тяга вертикального блока": Exercise("bench_press", 0.55, 10.0, 120.0, 2.5),
+    "тяга горизонтального блока": Exercise("bench_press", 0.55, 10.0, 120.0, 2.5),
+    "шраги с гантелями": Exercise("deadlift", 0.20, 4.0, 80.0, 2.0),
+    "косичка": Exercise("bench_press", 0.50, 5.0, 50.0, 2.5),
+    "французский жим лёжа": Exercise("bench_press", 0.25, 10.0, 60.0, 2.5),
+    "сгибания на бицепс ez грифа": Exercise("bench_press", 0.35, 5.0, 50.0, 2.5),
+    "подъем на бицепс с прямым грифом": Exercise("bench_press", 0.3, 10.0, 50.0, 2.5),
+    "молотки": Exercise("bench_press", 0.20, 4.0, 30.0, 2.0),
+    "передняя дельта": Exercise("bench_press", 0.18, 4.0, 25.0, 2.0),
+    "махи на среднюю дельту": Exercise("bench_press", 0.15, 2.0, 25.0, 2.0),
+    "отведения на дельты": Exercise("bench_press", 0.20, 10.0, 35.0, 2.0),
+    "подъем на носки в смите": Exercise("squat", 0.3, 30.0, 100.0, 5.0),
+    "сгибание на предплечье": Exercise("bench_press", 0.6, 25.0, 60.0, 2.5),
+    "разгибание на предплечье": Exercise("bench_press", 0.6, 25.0, 60.0, 2.5),
+    "разгибания ног в тренажере": Exercise("squat", 0.60, 30.0, 100.0, 5.0),
+    "сгибания ног в тренажере": Exercise("squat", 0.60, 30.0, 90.0, 5.0),
+    "жим гантелей лёжа 30°": Exercise("bench_press", 0.30, 10.0, 50.0, 2.0),
+    "жим штанги": Exercise("bench_press", 1.0, 20.0, 500.0, 2.5)
 }
 
+# Параметры для упражнений, которых нет в EXERCISE_MAPPING
+_DEFAULT_MAPPING = Exercise("bench_press", 0.3, 5.0, 80.0, 2.5)
+
+# Доля от базового веса для каждой интенсивности (с учётом вариантов написания)
+INTENSITY_FACTORS = {
+    "легкая": 0.60,
+    "средняя": 0.70,
+    "тяжёлая": 0.80,
+    "тяжелая": 0.80
+}
+
+# План тренировок PLAN[неделя][день]; заполняется при запуске бота в main()
+PLAN: dict[int, dict[str, list[tuple[str, str, str, str, int]]]] = {}
+
+
+# Загрузка данных из CSV
+def load_training_data() -> dict[int, dict[str, list[tuple[str, str, str, str, int]]]]:
+    """Обновляет training.csv из Excel-файла при необходимости и читает из него план тренировок."""
+    try:
+        csv_from_excel()
+        plan = load_plan()
+        logger.info("CSV данные успешно загружены")
+        return plan
+    except Exception as e:
+        logger.error("Ошибка при чтении CSV данных: %s", e)
+        raise
+
 
 # Функция для расчёта веса
+@functools.lru_cache(maxsize=4096)
 def calculate_weight(max_lift: float, intensity: str, exercise: str) -> str:
-    """Рассчитывает вес на основе максимума, интенсивности и упражнения с фиксированными процентами."""
+    """Рассчитывает вес на основе максимума, интенсивности и упражнения с фиксированными процентами.
+
+    intensity и exercise ожидаются в нижнем регистре (как ключи из PLAN).
+    """
     try:
-        mapping = EXERCISE_MAPPING.get(exercise.lower(), {
-            "main_lift": "bench_press",
-            "scale": 0.3,
-            "min_weight": 5.0,
-            "max_weight": 80.0,
-            "increment": 2.5
-        })
-        scale = mapping["scale"]
-        min_weight = mapping["min_weight"]
-        max_weight = mapping["max_weight"]
-        increment = mapping["increment"]
-
-        base_weight = max_lift * scale
-        intensity = intensity.lower()
-        if intensity == "легкая":
-            weight = base_weight * 0.60
-        elif intensity == "средняя":
-            weight = base_weight * 0.70
-        elif intensity == "тяжёлая" or intensity == "тяжелая":  # Учитываем возможные варианты написания
-            weight = base_weight * 0.80
-        else:
+        _, scale, min_weight, max_weight, increment = EXERCISE_MAPPING.get(exercise, _DEFAULT_MAPPING)
+
+        factor = INTENSITY_FACTORS.get(intensity)
+        if factor is None:
             return "Не указан вес (неизвестная интенсивность)"
 
+        weight = max_lift * scale * factor
         weight = max(min_weight, min(max_weight, round(weight / increment) * increment))
         return f"{weight:.1f} кг"
     except Exception as e:
-        logger.error(f"Ошибка при расчёте веса для упражнения {exercise}: {e}")
+        logger.error("Ошибка при расчёте веса для упражнения %s: %s", exercise, e)
         return "Ошибка расчёта веса"
 
 
 # Функция для форматирования программы тренировок
-async def format_workout_plan(user_id: int, week: int, day: str) -> str:
-    """Форматирует план тренировок для указанной недели и дня."""
-    user_data = load_user_data(user_id)
-    logger.info(f"Извлечены данные для пользователя {user_id}: {user_data}")
-
-    max_weights = {
-        "bench_press": user_data.get("bench_press", 0.0),
-        "squat": user_data.get("squat", 0.0),
-        "deadlift": user_data.get("deadlift", 0.0)
-    }
-    logger.info(f"Максимальные веса для пользователя {user_id}: {max_weights}")
-
-    result = f"**Программа тренировок на {day.capitalize()}, Неделя {week}**\n\n"
-    week_day_df = df[(df['неделя'] == week) & (df['день'] == day)]
-
-    if week_day_df.empty:
+def format_workout_plan(user_id: int, week: int, day: str, user_data: UserMax) -> str:
+    """Форматирует план тренировок для указанной недели и дня по максимальным весам пользователя."""
+    logger.info("Максимальные веса для пользователя %s: %s", user_id, user_data)
+
+    # Кэшированный текст действителен, пока веса пользователя не изменились
+    sig = user_data
+    user_renders = _render_cache.get(user_id)
+    if user_renders is None:
+        user_renders = _render_cache[user_id] = {}
+        if len(_render_cache) > RENDER_CACHE_SIZE:
+            _render_cache.popitem(last=False)
+    else:
+        _render_cache.move_to_end(user_id)
+    cached = user_renders.get((week, day))
+    if cached is not None and cached[0] == sig:
+        return cached[1]
+
+    parts: list[str] = [f"**Программа тренировок на {day.capitalize()}, Неделя {week}**\n\n"]
+    day_plan = PLAN.get(week, {}).get(day)
+
+    if not day_plan:
         return f"Ошибка: Данные для недели {week}, дня {day} не найдены."
 
-    for _, row in week_day_df.iterrows():
-        exercise = row['упражнения']
-        intensity = row['интенсивность']
-        reps = row['подходы х повторения']
-
-        mapping = EXERCISE_MAPPING.get(exercise.lower(), {"main_lift": "bench_press", "scale": 0.3})
-        main_lift = mapping["main_lift"]
-        max_lift = max_weights.get(main_lift, 0.0)
+    for exercise, exercise_key, intensity, reps, lift_index in day_plan:
+        max_lift = user_data[lift_index]
 
         weight = calculate_weight(max_lift, intensity,
-                                  exercise) if max_lift > 0 else "Введите максимальные веса (/сбросить)"
-        result += f"- {exercise}: {intensity.capitalize()} ({reps}, {weight})\n"
+                                  exercise_key) if max_lift > 0 else "Введите максимальные веса (/сбросить)"
+        parts.append(f"- {exercise}: {intensity.capitalize()} ({reps}, {weight})\n")
 
+    result = "".join(parts)
+    user_renders[(week, day)] = (sig, result)
     return result
 
 
+def _warm_render_cache(user_id: int, user_data: UserMax) -> None:
+    """Заранее форматирует все дни плана после сохранения весов, чтобы кнопки дней отвечали из кэша."""
+    for week, days in PLAN.items():
+        for day in days:
+            format_workout_plan(user_id, week, day, user_data)
+
+
 # Валидация ввода веса
+_WEIGHT_RE = re.compile(r'^\s*(-?(?:\d+(?:[.,]\d*)?|[.,]\d+))\s*$')
+
+
 def validate_weight(text: str) -> tuple[bool, float, str]:
-    """Проверяет, является ли введённый текст допустимым весом."""
-    try:
-        weight = float(text)
-        if weight < 0:
-            return False, 0.0, "Вес не может быть отрицательным."
-        if weight > 1000:
-            return False, 0.0, "Вес слишком большой. Введите реалистичное значение (до 1000 кг)."
-        return True, weight, ""
-    except ValueError:
+    """Проверяет, является ли введённый текст допустимым весом (допускается десятичная запятая)."""
+    match = _WEIGHT_RE.match(text)
+    if match is None:
         return False, 0.0, "Введите число (например, 100) или 'пропустить'."
+    weight = float(match.group(1).replace(',', '.'))
+    if weight < 0:
+        return False, 0.0, "Вес не может быть отрицательным."
+    if weight > 1000:
+        return False, 0.0, "Вес слишком большой. Введите реалистичное значение (до 1000 кг)."
+    return True, weight, ""
+
+
+# Общие тексты ответов
+MENU_PROMPT = "Выбери действие:"
+HELP_TEXT = "Выбери действие из доступных команд:"
+SKIPPED_TEXT = f"Вы пропустили ввод весов. План будет без расчёта весов.\n{MENU_PROMPT}"
+
+
+def format_weights_reply(title: str, user_data: UserMax) -> str:
+    """Формирует ответ со списком максимальных весов и приглашением выбрать действие."""
+    return (
+        f"{title}\n"
+        f"Жим лёжа: {user_data.bench_press} кг\n"
+        f"Присед: {user_data.squat} кг\n"
+        f"Становая тяга: {user_data.deadlift} кг\n"
+        f"{MENU_PROMPT}"
+    )
+
+
+# Ошибки, которые хендлеры ожидают и обрабатывают сами: сбои Telegram API и базы данных.
+# Остальные исключения попадают в общий errors_handler
+HANDLER_ERRORS = (TelegramAPIError, aiosqlite.Error)
+
+# Общие тексты ответов об ошибке
+GENERIC_ERROR_TEXT = "Произошла ошибка. Попробуйте снова."
+INPUT_ERROR_TEXT = "Произошла ошибка. Попробуйте снова или используй /cancel."
+
+
+async def _answer_callback(callback: CallbackQuery) -> None:
+    """Отвечает на callback, чтобы кнопка не осталась в состоянии загрузки; ответ мог уйти ещё до ошибки."""
+    with contextlib.suppress(TelegramAPIError):
+        await callback.answer()
+
+
+# Общая обработка ожидаемых ошибок для хендлеров
+def safe_handler(name: str, error_text: str, reply_markup: ReplyKeyboardMarkup | None = None):
+    """Оборачивает хендлер: ожидаемые ошибки логируются, а пользователь получает error_text."""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(event: Message | CallbackQuery, *args, **kwargs):
+            try:
+                return await handler(event, *args, **kwargs)
+            except HANDLER_ERRORS as e:
+                logger.error("Ошибка в %s для пользователя %s: %s", name, event.from_user.id, e)
+                if isinstance(event, CallbackQuery):
+                    await _answer_callback(event)
+                    target = event.message
+                else:
+                    target = event
+                await target.answer(error_text, reply_markup=reply_markup)
+        return wrapper
+    return decorator
 
 
 # Обработчик команды /start
 @router.message(CommandStart())
+@safe_handler("start_command", "Произошла ошибка. Попробуйте снова с /start.")
 async def start_command(message: Message, state: FSMContext):
     """Запускает процесс ввода максимальных весов."""
-    try:
-        await state.clear()
-        await message.answer("Привет! Я бот для тренировок. Давай начнём с твоих максимальных результатов.")
-        await message.answer("Введи свой максимальный вес в жиме лёжа (в кг, например, 100) или напиши 'пропустить':")
-        await state.set_state(MaxLiftForm.bench_press)
-        logger.info(f"Пользователь {message.from_user.id} начал ввод максимальных весов")
-    except Exception as e:
-        logger.error(f"Ошибка в start_command для пользователя {message.from_user.id}: {e}")
-        await message.answer("Произошла ошибка. Попробуйте снова с /start.")
+    await state.clear()
+    await message.answer("Привет! Я бот для тренировок. Давай начнём с твоих максимальных результатов.")
+    await message.answer("Введи свой максимальный вес в жиме лёжа (в кг, например, 100) или напиши 'пропустить':")
+    await state.set_state(MaxLiftForm.bench_press)
+    logger.info("Пользователь %s начал ввод максимальных весов", message.from_user.id)
 
 
 # Обработчик команды /cancel
 @router.message(Command("cancel"))
+@safe_handler("cancel_command", "Произошла ошибка при отмене. Попробуйте снова.", reply_markup=COMMAND_KEYBOARD)
 async def cancel_command(message: Message, state: FSMContext):
     """Отменяет текущий процесс ввода весов."""
-    try:
-        current_state = await state.get_state()
-        if current_state is None:
-            await message.answer("Нет активного процесса ввода весов.", reply_markup=get_reply_command_keyboard())
-            logger.info(f"Пользователь {message.from_user.id} попытался отменить, но не было активного состояния")
-            return
-        await state.clear()
-        await message.answer("Ввод весов отменён. Выбери действие:", reply_markup=get_reply_command_keyboard())
-        logger.info(f"Пользователь {message.from_user.id} отменил ввод весов")
-    except Exception as e:
-        logger.error(f"Ошибка в cancel_command для пользователя {message.from_user.id}: {e}")
-        await message.answer("Произошла ошибка при отмене. Попробуйте снова.",
-                             reply_markup=get_reply_command_keyboard())
+    current_state = await state.get_state()
+    if current_state is None:
+        await message.answer("Нет активного процесса ввода весов.", reply_markup=COMMAND_KEYBOARD)
+        logger.info("Пользователь %s попытался отменить, но не было активного состояния", message.from_user.id)
+        return
+    await state.clear()
+    await message.answer(f"Ввод весов отменён. {MENU_PROMPT}", reply_markup=COMMAND_KEYBOARD)
+    logger.info("Пользователь %s отменил ввод весов", message.from_user.id)
+
+
+# Варианты ввода для пропуска; остальное регистро-независимо проверяет is_skip
+_SKIP = ("пропустить", "Пропустить", "ПРОПУСТИТЬ", "/skip")
+
+
+def is_skip(text: str) -> bool:
+    """Проверяет, хочет ли пользователь пропустить ввод весов."""
+    return text in _SKIP or (len(text) <= 12 and text.lower() == 'пропустить')
+
+
+# Завершение ввода весов
+async def _finish_input(message: Message, state: FSMContext, **lifts: float) -> UserMax:
+    """Дописывает веса в FSM, сохраняет их в базу данных и завершает ввод."""
+    await state.update_data(**lifts)
+    user_data = await save_user_data(message.from_user.id, await state.get_data())
+    await state.clear()
+    _warm_render_cache(message.from_user.id, user_data)
+    return user_data
 
 
 # Обработчик ввода максимума в жиме лёжа
-@router.message(MaxLiftForm.bench_press)
+@router.message(MaxLiftForm.bench_press, F.text)
+@safe_handler("process_bench_press", INPUT_ERROR_TEXT)
 async def process_bench_press(message: Message, state: FSMContext):
     """Обрабатывает ввод максимального веса в жиме лёжа."""
-    try:
-        if message.text.lower() == 'пропустить':
-            await state.update_data(bench_press=0.0, squat=0.0, deadlift=0.0)
-            user_data = await state.get_data()
-            save_user_data(message.from_user.id, user_data)
-            await state.clear()
-            await message.answer(
-                "Вы пропустили ввод весов. План будет без расчёта весов.\nВыбери действие:",
-                reply_markup=get_reply_command_keyboard()
-            )
-            logger.info(f"Пользователь {message.from_user.id} пропустил ввод весов")
-            return
-
-        is_valid, weight, error_msg = validate_weight(message.text)
-        if not is_valid:
-            await message.answer(f"Ошибка: {error_msg} Для отмены используй /cancel.")
-            return
-
-        await state.update_data(bench_press=weight)
-        await message.answer("Отлично! Теперь введи свой максимальный вес в приседе (в кг) или 'пропустить':")
-        await state.set_state(MaxLiftForm.squat)
-        logger.info(f"Пользователь {message.from_user.id} ввёл жим лёжа: {weight} кг")
-    except Exception as e:
-        logger.error(f"Ошибка в process_bench_press для пользователя {message.from_user.id}: {e}")
-        await message.answer("Произошла ошибка. Попробуйте снова или используй /cancel.")
+    if is_skip(message.text):
+        await _finish_input(message, state, bench_press=0.0, squat=0.0, deadlift=0.0)
+        await message.answer(SKIPPED_TEXT, reply_markup=COMMAND_KEYBOARD)
+        logger.info("Пользователь %s пропустил ввод весов", message.from_user.id)
+        return
+
+    is_valid, weight, error_msg = validate_weight(message.text)
+    if not is_valid:
+        await message.answer(f"Ошибка: {error_msg} Для отмены используй /cancel.")
+        return
+
+    await state.update_data(bench_press=weight)
+    await message.answer("Отлично! Теперь введи свой максимальный вес в приседе (в кг) или 'пропустить':")
+    await state.set_state(MaxLiftForm.squat)
+    logger.info("Пользователь %s ввёл жим лёжа: %s кг", message.from_user.id, weight)
 
 
 # Обработчик ввода максимума в приседе
-@router.message(MaxLiftForm.squat)
+@router.message(MaxLiftForm.squat, F.text)
+@safe_handler("process_squat", INPUT_ERROR_TEXT)
 async def process_squat(message: Message, state: FSMContext):
     """Обрабатывает ввод максимального веса в приседе."""
-    try:
-        if message.text.lower() == 'пропустить':
-            await state.update_data(squat=0.0, deadlift=0.0)
-            user_data = await state.get_data()
-            save_user_data(message.from_user.id, user_data)
-            await state.clear()
-            await message.answer(
-                "Вы пропустили ввод весов. План будет без расчёта весов.\nВыбери действие:",
-                reply_markup=get_reply_command_keyboard()
-            )
-            logger.info(f"Пользователь {message.from_user.id} пропустил ввод весов")
-            return
-
-        is_valid, weight, error_msg = validate_weight(message.text)
-        if not is_valid:
-            await message.answer(f"Ошибка: {error_msg} Для отмены используй /cancel.")
-            return
-
-        await state.update_data(squat=weight)
-        await message.answer("Супер! Введи свой максимальный вес в становой тяге (в кг) или 'пропустить':")
-        await state.set_state(MaxLiftForm.deadlift)
-        logger.info(f"Пользователь {message.from_user.id} ввёл присед: {weight} кг")
-    except Exception as e:
-        logger.error(f"Ошибка в process_squat для пользователя {message.from_user.id}: {e}")
-        await message.answer("Произошла ошибка. Попробуйте снова или используй /cancel.")
+    if is_skip(message.text):
+        await _finish_input(message, state, squat=0.0, deadlift=0.0)
+        await message.answer(SKIPPED_TEXT, reply_markup=COMMAND_KEYBOARD)
+        logger.info("Пользователь %s пропустил ввод весов", message.from_user.id)
+        return
+
+    is_valid, weight, error_msg = validate_weight(message.text)
+    if not is_valid:
+        await message.answer(f"Ошибка: {error_msg} Для отмены используй /cancel.")
+        return
+
+    await state.update_data(squat=weight)
+    await message.answer("Супер! Введи свой максимальный вес в становой тяге (в кг) или 'пропустить':")
+    await state.set_state(MaxLiftForm.deadlift)
+    logger.info("Пользователь %s ввёл присед: %s кг", message.from_user.id, weight)
 
 
 # Обработчик ввода максимума в становой тяге
-@router.message(MaxLiftForm.deadlift)
+@router.message(MaxLiftForm.deadlift, F.text)
+@safe_handler("process_deadlift", INPUT_ERROR_TEXT)
 async def process_deadlift(message: Message, state: FSMContext):
     """Обрабатывает ввод максимального веса в становой тяге."""
-    try:
-        if message.text.lower() == 'пропустить':
-            await state.update_data(deadlift=0.0)
-            user_data = await state.get_data()
-            save_user_data(message.from_user.id, user_data)
-            await state.clear()
-            await message.answer(
-                f"Ввод завершён. Текущие веса:\n"
-                f"Жим лёжа: {user_data.get('bench_press', 0.0)} кг\n"
-                f"Присед: {user_data.get('squat', 0.0)} кг\n"
-                f"Становая тяга: {user_data.get('deadlift', 0.0)} кг\n"
-                "Выбери действие:",
-                reply_markup=get_reply_command_keyboard()
-            )
-            logger.info(f"Пользователь {message.from_user.id} пропустил ввод становой тяги. Текущие веса: {user_data}")
-            return
-
-        is_valid, weight, error_msg = validate_weight(message.text)
-        if not is_valid:
-            await message.answer(f"Ошибка: {error_msg} Для отмены используй /cancel.")
-            return
-
-        await state.update_data(deadlift=weight)
-        user_data = await state.get_data()
-        save_user_data(message.from_user.id, user_data)
-        await state.clear()
+    if is_skip(message.text):
+        user_data = await _finish_input(message, state, deadlift=0.0)
         await message.answer(
-            f"Отлично, данные сохранены!\n"
-            f"Жим лёжа: {user_data['bench_press']} кг\n"
-            f"Присед: {user_data['squat']} кг\n"
-            f"Становая тяга: {user_data['deadlift']} кг\n"
-            "Выбери действие:",
-            reply_markup=get_reply_command_keyboard()
+            format_weights_reply("Ввод завершён. Текущие веса:", user_data),
+            reply_markup=COMMAND_KEYBOARD
         )
-        logger.info(f"Пользователь {message.from_user.id} завершил ввод весов: {user_data}")
-    except Exception as e:
-        logger.error(f"Ошибка в process_deadlift для пользователя {message.from_user.id}: {e}")
-        await message.answer("Произошла ошибка. Попробуйте снова или используй /cancel.")
+        logger.info("Пользователь %s пропустил ввод становой тяги. Текущие веса: %s",
+                    message.from_user.id, user_data)
+        return
+
+    is_valid, weight, error_msg = validate_weight(message.text)
+    if not is_valid:
+        await message.answer(f"Ошибка: {error_msg} Для отмены используй /cancel.")
+        return
+
+    user_data = await _finish_input(message, state, deadlift=weight)
+    await message.answer(
+        format_weights_reply("Отлично, данные сохранены!", user_data),
+        reply_markup=COMMAND_KEYBOARD
+    )
+    logger.info("Пользователь %s завершил ввод весов: %s", message.from_user.id, user_data)
+
+
+# Обработчик сообщений без текста (стикеры, фото) во время ввода весов
+@router.message(StateFilter(MaxLiftForm.bench_press, MaxLiftForm.squat, MaxLiftForm.deadlift))
+@safe_handler("process_non_text_weight", INPUT_ERROR_TEXT)
+async def process_non_text_weight(message: Message):
+    """Просит ввести вес текстом, если пользователь прислал не текст."""
+    await message.answer("Ошибка: Введите число (например, 100) или 'пропустить'. Для отмены используй /cancel.")
+    logger.info("Пользователь %s прислал не текст во время ввода весов", message.from_user.id)
 
 
 # Обработчик команды /результаты
 @router.message(Command("результаты"))
+@safe_handler("my_weights_command", "Произошла ошибка при получении весов. Попробуйте снова.",
+              reply_markup=COMMAND_KEYBOARD)
 async def my_weights_command(message: Message, state: FSMContext):
     """Отображает текущие максимальные веса пользователя."""
-    try:
-        user_data = load_user_data(message.from_user.id)
-        logger.info(f"Проверка весов для пользователя {message.from_user.id}: {user_data}")
-        if not user_data or all(value == 0.0 for value in user_data.values()):
-            await message.answer(
-                "Вы ещё не ввели максимальные веса. Используй /сбросить для ввода.",
-                reply_markup=get_reply_command_keyboard()
-            )
-            logger.info(f"Пользователь {message.from_user.id} запросил веса, но данные отсутствуют")
-            return
+    user_data = await load_user_data(message.from_user.id)
+    logger.info("Проверка весов для пользователя %s: %s", message.from_user.id, user_data)
+    if not any(user_data):
         await message.answer(
-            f"Текущие максимальные веса:\n"
-            f"Жим лёжа: {user_data.get('bench_press', 0.0)} кг\n"
-            f"Присед: {user_data.get('squat', 0.0)} кг\n"
-            f"Становая тяга: {user_data.get('deadlift', 0.0)} кг\n"
-            "Выбери действие:",
-            reply_markup=get_reply_command_keyboard()
+            "Вы ещё не ввели максимальные веса. Используй /сбросить для ввода.",
+            reply_markup=COMMAND_KEYBOARD
         )
-        logger.info(f"Пользователь {message.from_user.id} запросил текущие веса: {user_data}")
-    except Exception as e:
-        logger.error(f"Ошибка в my_weights_command для пользователя {message.from_user.id}: {e}")
-        await message.answer("Произошла ошибка при получении весов. Попробуйте снова.",
-                             reply_markup=get_reply_command_keyboard())
+        logger.info("Пользователь %s запросил веса, но данные отсутствуют", message.from_user.id)
+        return
+    await message.answer(
+        format_weights_reply("Текущие максимальные веса:", user_data),
+        reply_markup=COMMAND_KEYBOARD
+    )
+    logger.info("Пользователь %s запросил текущие веса: %s", message.from_user.id, user_data)
 
 
 # Обработчик кнопки "результаты"
-@router.message(lambda message: message.text == "результаты")
+@router.message(F.text == "результаты")
 async def my_weights_button(message: Message, state: FSMContext):
     """Обрабатывает нажатие кнопки 'результаты'."""
     await my_weights_command(message, state)
@@ -518,23 +750,19 @@ async def my_weights_button(message: Message, state: FSMContext):
 
 # Обработчик команды /сбросить
 @router.message(Command("сбросить"))
+@safe_handler("reset_command", "Произошла ошибка при сбросе весов. Попробуйте снова.", reply_markup=COMMAND_KEYBOARD)
 async def reset_command(message: Message, state: FSMContext):
     """Сбрасывает максимальные веса и начинает ввод заново."""
-    try:
-        await state.clear()
-        clear_user_data(message.from_user.id)
-        await message.answer(
-            "Максимальные веса сброшены. Введи свой максимальный вес в жиме лёжа (в кг) или 'пропустить':")
-        await state.set_state(MaxLiftForm.bench_press)
-        logger.info(f"Пользователь {message.from_user.id} сбросил максимальные веса")
-    except Exception as e:
-        logger.error(f"Ошибка в reset_command для пользователя {message.from_user.id}: {e}")
-        await message.answer("Произошла ошибка при сбросе весов. Попробуйте снова.",
-                             reply_markup=get_reply_command_keyboard())
+    await state.clear()
+    await clear_user_data(message.from_user.id)
+    await message.answer(
+        "Максимальные веса сброшены. Введи свой максимальный вес в жиме лёжа (в кг) или 'пропустить':")
+    await state.set_state(MaxLiftForm.bench_press)
+    logger.info("Пользователь %s сбросил максимальные веса", message.from_user.id)
 
 
 # Обработчик кнопки "сбросить"
-@router.message(lambda message: message.text == "сбросить")
+@router.message(F.text == "сбросить")
 async def reset_button(message: Message, state: FSMContext):
     """Обрабатывает нажатие кнопки 'сбросить'."""
     await reset_command(message, state)
@@ -542,168 +770,176 @@ async def reset_button(message: Message, state: FSMContext):
 
 # Обработчик команды /неделя
 @router.message(Command("неделя"))
+@safe_handler("week_command", GENERIC_ERROR_TEXT, reply_markup=COMMAND_KEYBOARD)
 async def week_command(message: Message, state: FSMContext):
     """Отображает inline-клавиатуру с выбором недели."""
-    try:
-        await state.clear()
-        await message.answer(
-            "Выбери неделю для тренировки:",
-            reply_markup=get_week_keyboard()
-        )
-        logger.info(f"Пользователь {message.from_user.id} запросил выбор недели")
-    except Exception as e:
-        logger.error(f"Ошибка в week_command для пользователя {message.from_user.id}: {e}")
-        await message.answer("Произошла ошибка. Попробуйте снова.", reply_markup=get_reply_command_keyboard())
+    await state.clear()
+    await message.answer(
+        "Выбери неделю для тренировки:",
+        reply_markup=WEEK_KEYBOARD
+    )
+    logger.info("Пользователь %s запросил выбор недели", message.from_user.id)
 
 
 # Обработчик кнопки "неделя"
-@router.message(lambda message: message.text == "неделя")
+@router.message(F.text == "неделя")
 async def week_button(message: Message, state: FSMContext):
     """Обрабатывает нажатие кнопки 'неделя'."""
     await week_command(message, state)
 
 
+async def _send(method):
+    """Выполняет метод Bot API; asyncio.gather принимает только корутины, а не объекты TelegramMethod."""
+    return await method
+
+
 # Обработчик callback для выбора недели
-@router.callback_query(lambda c: c.data.startswith("week_"))
+@router.callback_query(F.data.startswith("week_"))
+@safe_handler("process_week_callback", GENERIC_ERROR_TEXT, reply_markup=COMMAND_KEYBOARD)
 async def process_week_callback(callback: CallbackQuery, state: FSMContext):
     """Обрабатывает выбор недели и запрашивает день."""
-    try:
-        week = int(callback.data.split("_")[1])
-        await state.update_data(selected_week=week)
-        await state.set_state(MaxLiftForm.week_selection)
-        await callback.message.edit_text(
+    week = _WEEK_LOOKUP.get(callback.data)
+    if week is None:
+        logger.warning("Пользователь %s прислал неизвестную неделю: %s", callback.from_user.id, callback.data)
+        await asyncio.gather(
+            _send(callback.answer()),
+            _send(callback.message.answer("Такой недели нет. Выбери неделю из списка.", reply_markup=WEEK_KEYBOARD))
+        )
+        return
+    await state.update_data(selected_week=week)
+    await state.set_state(MaxLiftForm.week_selection)
+    # Ответ на callback и оба сообщения независимы, поэтому отправляются параллельно
+    await asyncio.gather(
+        _send(callback.answer()),
+        _send(callback.message.edit_text(
             f"Выбрана неделя {week}. Выбери день для тренировки:",
             reply_markup=None
-        )
-        await callback.message.answer(
+        )),
+        _send(callback.message.answer(
             "Выбери день:",
-            reply_markup=get_days_only_keyboard()
-        )
-        logger.info(f"Пользователь {callback.from_user.id} выбрал неделю {week}")
-    except Exception as e:
-        logger.error(f"Ошибка в process_week_callback для пользователя {callback.from_user.id}: {e}")
-        await callback.message.answer("Произошла ошибка. Попробуйте снова.", reply_markup=get_reply_command_keyboard())
-    finally:
-        await callback.answer()
+            reply_markup=DAYS_KEYBOARD
+        ))
+    )
+    logger.info("Пользователь %s выбрал неделю %s", callback.from_user.id, week)
 
 
 # Обработчик команды /помощь
 @router.message(Command("помощь"))
+@safe_handler("help_command", "Произошла ошибка при отображении помощи. Попробуйте снова.",
+              reply_markup=COMMAND_KEYBOARD)
 async def help_command(message: Message):
     """Отображает список доступных команд."""
-    try:
-        await message.answer(
-            "Выбери действие из доступных команд:",
-            reply_markup=get_reply_command_keyboard()
-        )
-        logger.info(f"Пользователь {message.from_user.id} запросил помощь")
-    except Exception as e:
-        logger.error(f"Ошибка в help_command для пользователя {message.from_user.id}: {e}")
-        await message.answer("Произошла ошибка при отображении помощи. Попробуйте снова.",
-                             reply_markup=get_reply_command_keyboard())
+    await message.answer(HELP_TEXT, reply_markup=COMMAND_KEYBOARD)
+    logger.info("Пользователь %s запросил помощь", message.from_user.id)
 
 
 # Обработчик кнопки "помощь"
-@router.message(lambda message: message.text == "помощь")
+@router.message(F.text == "помощь")
 async def help_button(message: Message):
     """Обрабатывает нажатие кнопки 'помощь'."""
     await help_command(message)
 
 
-# Обработчик кнопки "понедельник"
-@router.message(MaxLiftForm.week_selection, lambda message: message.text == "понедельник")
-async def monday_button(message: Message, state: FSMContext):
-    """Обрабатывает нажатие кнопки 'понедельник'."""
-    try:
-        data = await state.get_data()
-        week = data.get("selected_week")
-        if not week:
-            await message.answer("Ошибка: неделя не выбрана. Используй кнопку 'неделя'.",
-                                 reply_markup=get_reply_command_keyboard())
-            return
-        workout_plan = await format_workout_plan(user_id=message.from_user.id, week=week, day="понедельник")
-        await message.answer(
-            workout_plan,
-            reply_markup=get_days_only_keyboard()
-        )
-        logger.info(f"Пользователь {message.from_user.id} запросил программу на понедельник, неделя {week}")
-    except Exception as e:
-        logger.error(f"Ошибка в monday_button для пользователя {message.from_user.id}: {e}")
-        await message.answer("Произошла ошибка. Попробуйте снова.", reply_markup=get_reply_command_keyboard())
-
-
-# Обработчик кнопки "среда"
-@router.message(MaxLiftForm.week_selection, lambda message: message.text == "среда")
-async def wednesday_button(message: Message, state: FSMContext):
-    """Обрабатывает нажатие кнопки 'среда'."""
-    try:
-        data = await state.get_data()
-        week = data.get("selected_week")
-        if not week:
-            await message.answer("Ошибка: неделя не выбрана. Используй кнопку 'неделя'.",
-                                 reply_markup=get_reply_command_keyboard())
-            return
-        workout_plan = await format_workout_plan(user_id=message.from_user.id, week=week, day="среда")
-        await message.answer(
-            workout_plan,
-            reply_markup=get_days_only_keyboard()
-        )
-        logger.info(f"Пользователь {message.from_user.id} запросил программу на среду, неделя {week}")
-    except Exception as e:
-        logger.error(f"Ошибка в wednesday_button для пользователя {message.from_user.id}: {e}")
-        await message.answer("Произошла ошибка. Попробуйте снова.", reply_markup=get_reply_command_keyboard())
-
-
-# Обработчик кнопки "пятница"
-@router.message(MaxLiftForm.week_selection, lambda message: message.text == "пятница")
-async def friday_button(message: Message, state: FSMContext):
-    """Обрабатывает нажатие кнопки 'пятница'."""
-    try:
-        data = await state.get_data()
-        week = data.get("selected_week")
-        if not week:
-            await message.answer("Ошибка: неделя не выбрана. Используй кнопку 'неделя'.",
-                                 reply_markup=get_reply_command_keyboard())
-            return
-        workout_plan = await format_workout_plan(user_id=message.from_user.id, week=week, day="пятница")
-        await message.answer(
-            workout_plan,
-            reply_markup=get_days_only_keyboard()
-        )
-        logger.info(f"Пользователь {message.from_user.id} запросил программу на пятницу, неделя {week}")
-    except Exception as e:
-        logger.error(f"Ошибка в friday_button для пользователя {message.from_user.id}: {e}")
-        await message.answer("Произошла ошибка. Попробуйте снова.", reply_markup=get_reply_command_keyboard())
+# Дни недели, для которых есть программа тренировок
+WORKOUT_DAYS = frozenset({"понедельник", "среда", "пятница"})
+
+
+# Обработчик кнопок дней недели
+@router.message(MaxLiftForm.week_selection, F.text.in_(WORKOUT_DAYS))
+@safe_handler("day_button", GENERIC_ERROR_TEXT, reply_markup=COMMAND_KEYBOARD)
+async def day_button(message: Message, state: FSMContext):
+    """Отображает программу тренировок на выбранный день недели."""
+    day = message.text
+    data = await state.get_data()
+    week = data.get("selected_week")
+    if not week:
+        await message.answer("Ошибка: неделя не выбрана. Используй кнопку 'неделя'.",
+                             reply_markup=COMMAND_KEYBOARD)
+        return
+    user_data = await load_user_data(message.from_user.id)
+    workout_plan = format_workout_plan(user_id=message.from_user.id, week=week, day=day,
+                                       user_data=user_data)
+    await message.answer(
+        workout_plan,
+        reply_markup=DAYS_KEYBOARD
+    )
+    logger.info("Пользователь %s запросил программу на %s, неделя %s", message.from_user.id, day, week)
 
 
 # Обработчик кнопки "Назад"
-@router.message(MaxLiftForm.week_selection, lambda message: message.text == "Назад")
+@router.message(MaxLiftForm.week_selection, F.text == "Назад")
+@safe_handler("back_button", GENERIC_ERROR_TEXT, reply_markup=COMMAND_KEYBOARD)
 async def back_button(message: Message, state: FSMContext):
     """Обрабатывает нажатие кнопки 'Назад' для возврата к главному меню."""
+    await state.clear()
+    await message.answer(MENU_PROMPT, reply_markup=COMMAND_KEYBOARD)
+    logger.info("Пользователь %s вернулся к главному меню", message.from_user.id)
+
+
+# Обработчик непредвиденных ошибок во всех хендлерах
+@dp.errors()
+async def errors_handler(event: ErrorEvent):
+    """Логирует необработанное исключение и сообщает пользователю об ошибке."""
+    logger.error("Необработанная ошибка при обработке обновления %s: %s",
+                 event.update.update_id, event.exception, exc_info=event.exception)
+    if event.update.callback_query is not None:
+        await _answer_callback(event.update.callback_query)
+    message = event.update.message or (event.update.callback_query and event.update.callback_query.message)
+    if message is not None:
+        try:
+            await message.answer(GENERIC_ERROR_TEXT, reply_markup=COMMAND_KEYBOARD)
+        except TelegramAPIError as e:
+            logger.error("Не удалось отправить сообщение об ошибке: %s", e)
+    return True
+
+
+# Приём обновлений через webhook
+async def run_webhook() -> None:
+    """Поднимает aiohttp-сервер для webhook и регистрирует его адрес в Telegram."""
+    # Серверная часть нужна только в режиме webhook, поэтому при polling эти модули не загружаются
+    from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+    from aiohttp import web
+
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    runner = web.AppRunner(app)
+    await runner.setup()
     try:
-        await state.clear()
-        await message.answer(
-            "Выбери действие:",
-            reply_markup=get_reply_command_keyboard()
-        )
-        logger.info(f"Пользователь {message.from_user.id} вернулся к главному меню")
-    except Exception as e:
-        logger.error(f"Ошибка в back_button для пользователя {message.from_user.id}: {e}")
-        await message.answer("Произошла ошибка. Попробуйте снова.", reply_markup=get_reply_command_keyboard())
+        await web.TCPSite(runner, WEBAPP_HOST, WEBAPP_PORT).start()
+        await bot.set_webhook(f"{WEBHOOK_URL}{WEBHOOK_PATH}", secret_token=WEBHOOK_SECRET,
+                              drop_pending_updates=True)
+        logger.info("Бот запущен в режиме webhook на %s:%s", WEBAPP_HOST, WEBAPP_PORT)
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
 
 
 # Основная функция для запуска бота
 async def main():
-    """Запускает бота и инициализирует базу данных."""
+    """Загружает план тренировок, инициализирует базу данных и запускает бота."""
+    global PLAN
     try:
-        init_db()
-        await bot.delete_webhook(drop_pending_updates=True)
-        logger.info("Бот запущен...")
-        await dp.start_polling(bot)
+        # Чтение Excel и CSV — блокирующий файловый ввод-вывод, поэтому выполняется в отдельном потоке
+        PLAN = await asyncio.to_thread(load_training_data)
+        await init_db()
+        if WEBHOOK_URL:
+            await run_webhook()
+        else:
+            await bot.delete_webhook(drop_pending_updates=True)
+            logger.info("Бот запущен...")
+            await dp.start_polling(bot)
     except Exception as e:
-        logger.error(f"Ошибка при запуске бота: {e}")
+        logger.error("Ошибка при запуске бота: %s", e)
         raise
+    finally:
+        await close_db()
+        await storage.close()
+        await bot.session.close()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
\ No newline at end of file
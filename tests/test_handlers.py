@@ -0,0 +1,228 @@
+import asyncio
+import datetime
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# Тестовый токен, хранилище в памяти и временный лог задаются до импорта бота,
+# чтобы тесты не писали в bot.log рядом с main.py
+os.environ.setdefault("API_TOKEN", "42:TEST")
+os.environ.pop("REDIS_URL", None)
+LOG_DIR = tempfile.TemporaryDirectory()
+os.environ["BOT_LOG_PATH"] = os.path.join(LOG_DIR.name, "bot.log")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiosqlite
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import AnswerCallbackQuery, EditMessageText, SendMessage
+from aiogram.types import CallbackQuery, Chat, Message, PhotoSize, Update, User
+
+import main
+
+USER = User(id=7, is_bot=False, first_name="Тест")
+CHAT = Chat(id=7, type="private")
+
+
+class RecordingSession(BaseSession):
+    """Сессия без сети: запоминает вызванные методы Bot API и отвечает успешно."""
+
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests.append(method)
+        if isinstance(method, SendMessage):
+            return Message(message_id=len(self.requests), date=datetime.datetime.now(), chat=CHAT, text=method.text)
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+def _week_update(data: str) -> Update:
+    """Создаёт обновление с нажатием inline-кнопки выбора недели."""
+    message = Message(message_id=1, date=datetime.datetime.now(), chat=CHAT, text="Выбери неделю для тренировки:")
+    return Update(update_id=1, callback_query=CallbackQuery(
+        id="cb1", from_user=USER, chat_instance="ci", data=data, message=message
+    ))
+
+
+class WeekCallbackTest(unittest.TestCase):
+    def setUp(self):
+        self.session = RecordingSession()
+        self.bot = Bot(token=os.environ["API_TOKEN"], session=self.session)
+
+    def feed(self, update: Update) -> list:
+        asyncio.run(main.dp.feed_update(self.bot, update))
+        return self.session.requests
+
+    def test_week_choice_answers_callback_and_sends_days(self):
+        requests = self.feed(_week_update("week_3"))
+        self.assertEqual(sum(isinstance(r, AnswerCallbackQuery) for r in requests), 1)
+        self.assertTrue(any(isinstance(r, EditMessageText) and "неделя 3" in r.text for r in requests))
+        sent = [r for r in requests if isinstance(r, SendMessage)]
+        self.assertEqual(len(sent), 1)
+        self.assertIs(sent[0].reply_markup, main.DAYS_KEYBOARD)
+
+    def test_unknown_week_answers_callback(self):
+        requests = self.feed(_week_update("week_42"))
+        self.assertEqual(sum(isinstance(r, AnswerCallbackQuery) for r in requests), 1)
+        self.assertTrue(any(isinstance(r, SendMessage) and r.reply_markup is main.WEEK_KEYBOARD for r in requests))
+
+    def test_expected_error_answers_callback(self):
+        lookup = mock.Mock(get=mock.Mock(side_effect=aiosqlite.Error("boom")))
+        with mock.patch.object(main, "_WEEK_LOOKUP", lookup):
+            requests = self.feed(_week_update("week_3"))
+        self.assertEqual(sum(isinstance(r, AnswerCallbackQuery) for r in requests), 1)
+        self.assertTrue(any(isinstance(r, SendMessage) and r.text == main.GENERIC_ERROR_TEXT for r in requests))
+
+    def test_unexpected_error_answers_callback(self):
+        lookup = mock.Mock(get=mock.Mock(side_effect=RuntimeError("boom")))
+        with mock.patch.object(main, "_WEEK_LOOKUP", lookup), mock.patch.object(main.logger, "error"):
+            requests = self.feed(_week_update("week_3"))
+        self.assertEqual(sum(isinstance(r, AnswerCallbackQuery) for r in requests), 1)
+        self.assertTrue(any(isinstance(r, SendMessage) and r.text == main.GENERIC_ERROR_TEXT for r in requests))
+
+
+class WeightInputTest(unittest.TestCase):
+    def setUp(self):
+        self.session = RecordingSession()
+        self.bot = Bot(token=os.environ["API_TOKEN"], session=self.session)
+
+    def test_photo_during_weight_entry_asks_for_number(self):
+        photo = Message(message_id=2, date=datetime.datetime.now(), chat=CHAT, from_user=USER,
+                        photo=[PhotoSize(file_id="f", file_unique_id="u", width=1, height=1)])
+
+        async def scenario():
+            context = main.dp.fsm.get_context(self.bot, chat_id=CHAT.id, user_id=USER.id)
+            await context.set_state(main.MaxLiftForm.bench_press)
+            await main.dp.feed_update(self.bot, Update(update_id=2, message=photo))
+            self.assertEqual(await context.get_state(), main.MaxLiftForm.bench_press.state)
+            await context.clear()
+
+        asyncio.run(scenario())
+        sent = [r for r in self.session.requests if isinstance(r, SendMessage)]
+        self.assertEqual(len(sent), 1)
+        self.assertIn("Введите число", sent[0].text)
+        self.assertNotEqual(sent[0].text, main.GENERIC_ERROR_TEXT)
+
+
+class ValidateWeightTest(unittest.TestCase):
+    def test_validate_weight(self):
+        not_a_number = "Введите число (например, 100) или 'пропустить'."
+        negative = "Вес не может быть отрицательным."
+        too_heavy = "Вес слишком большой. Введите реалистичное значение (до 1000 кг)."
+        cases = [
+            ("100", (True, 100.0, "")),
+            ("  82.5 ", (True, 82.5, "")),
+            ("100,5", (True, 100.5, "")),
+            ("100.", (True, 100.0, "")),
+            (".5", (True, 0.5, "")),
+            ("0", (True, 0.0, "")),
+            ("1000", (True, 1000.0, "")),
+            ("1000.5", (False, 0.0, too_heavy)),
+            ("-5", (False, 0.0, negative)),
+            ("-.5", (False, 0.0, negative)),
+            ("nan", (False, 0.0, not_a_number)),
+            ("inf", (False, 0.0, not_a_number)),
+            ("1e3", (False, 0.0, not_a_number)),
+            ("1 000", (False, 0.0, not_a_number)),
+            ("сто", (False, 0.0, not_a_number)),
+            ("", (False, 0.0, not_a_number)),
+        ]
+        for text, expected in cases:
+            with self.subTest(text=text):
+                self.assertEqual(main.validate_weight(text), expected)
+
+    def test_is_skip(self):
+        cases = [
+            ("пропустить", True),
+            ("Пропустить", True),
+            ("ПРОПУСТИТЬ", True),
+            ("пРоПуСтИтЬ", True),
+            ("/skip", True),
+            ("пропустить всё", False),
+            ("100", False),
+            ("", False),
+        ]
+        for text, expected in cases:
+            with self.subTest(text=text):
+                self.assertEqual(main.is_skip(text), expected)
+
+
+class UserCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.db_path = main.DB_PATH
+        main.DB_PATH = os.path.join(self.tmp.name, "test.db")
+        main._user_cache.clear()
+
+    def tearDown(self):
+        main.DB_PATH = self.db_path
+        main._user_cache.clear()
+
+    def test_concurrent_load_does_not_cache_stale_weights(self):
+        async def scenario():
+            await main.init_db()
+            try:
+                await main.save_user_data(6, {"bench_press": 1.0})
+                for _ in range(20):
+                    main._user_cache.clear()
+                    await asyncio.gather(main.load_user_data(6), main.save_user_data(6, {"bench_press": 2.0}))
+                    self.assertEqual(main._user_cache.get(6, main.UserMax(2.0)).bench_press, 2.0)
+                    await main.save_user_data(6, {"bench_press": 1.0})
+            finally:
+                await main.close_db()
+
+        asyncio.run(scenario())
+
+
+class RenderCacheTest(unittest.TestCase):
+    PLAN = {1: {"понедельник": [("Жим лёжа", "жим лёжа", "тяжёлая", "5x3", 0)]}}
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.db_path = main.DB_PATH
+        main.DB_PATH = os.path.join(self.tmp.name, "test.db")
+        main._user_cache.clear()
+        main._render_cache.clear()
+
+    def tearDown(self):
+        main.DB_PATH = self.db_path
+        main._user_cache.clear()
+        main._render_cache.clear()
+
+    def test_render_reflects_updated_weights(self):
+        async def render():
+            user_data = await main.load_user_data(8)
+            return main.format_workout_plan(8, 1, "понедельник", user_data)
+
+        async def scenario():
+            await main.init_db()
+            try:
+                await main.save_user_data(8, {"bench_press": 100.0})
+                first = await render()
+                self.assertEqual(await render(), first)
+                await main.save_user_data(8, {"bench_press": 110.0})
+                return first, await render()
+            finally:
+                await main.close_db()
+
+        with mock.patch.object(main, "PLAN", self.PLAN):
+            first, second = asyncio.run(scenario())
+        self.assertIn("80.0 кг", first)
+        self.assertIn("87.5 кг", second)
+        self.assertNotIn("80.0 кг", second)
+
+
+if __name__ == "__main__":
+    unittest.main()